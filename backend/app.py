@@ -2,13 +2,16 @@
 Weapon Detection Backend
 ------------------------
 Loads a custom model if present; otherwise auto-downloads YOLOv8n and uses it.
+On first start the weights are exported to TensorRT (GPU) or OpenVINO (CPU) and
+the cached export is loaded from then on.
 
 Endpoints:
   GET  /                   -> health JSON
   GET  /video              -> webcam MJPEG stream
   GET  /cctv?stream=URL    -> RTSP/IP camera MJPEG stream
   GET  /detection-status   -> {"detected": bool}
-  POST /upload             -> image/video detect; returns annotated image (image) or JSON (video)
+  POST /upload             -> image/video detect; returns annotated image (image) or a job id (video)
+  GET  /upload/status/ID   -> video job status; the detection JSON once done
 
 Detection keywords: "gun", "knife", "weapon" (case-insensitive substring match).
 
@@ -19,27 +22,61 @@ Run:
   python -m venv venv
   .\\venv\\Scripts\\Activate.ps1
   pip install -r requirements.txt
+  pip install -r requirements-gpu.txt   # CUDA hosts: TensorRT / ONNX export
   python app.py
+
+Production (Linux):
+  gunicorn -c gunicorn.conf.py app:app
 """
 
+import asyncio
+import collections
+import functools
+import importlib.util
+import itertools
 import os
+import queue
+import shutil
+import subprocess
 import time
 import threading
-import smtplib
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from email.message import EmailMessage
-from typing import Union
+from typing import Optional, Union
 
+import aiosmtplib
 import cv2
 import numpy as np
+import torch
 from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
+from werkzeug.utils import secure_filename
+from torchvision.io import encode_jpeg
 from ultralytics import YOLO
 
+try:
+    import av
+    from av.codec.hwaccel import HWAccel
+except ImportError:  # PyAV missing, or too old (<14) for hardware decoding
+    av = None
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    TurboJPEG()  # raises if the libjpeg-turbo shared library is missing
+except (ImportError, OSError):
+    TurboJPEG = None
+
 # ------------------------------------------------------------------
 # Config
 # ------------------------------------------------------------------
 CUSTOM_MODEL ='weights/best.pt'   # your trained weights (optional)
 FALLBACK_MODEL = "yolov8n.pt"         # Ultralytics small model (auto-download)
+MODEL_IMGSZ = 640          # inference size; exported engines are built for it
+EXPORT_ACCELERATED = True  # build a TensorRT (GPU) / OpenVINO (CPU) copy once and load that
+COMPILE_EAGER = True       # torch.compile the PyTorch model when no accelerated export loaded
+EXPORT_INT8 = False        # quantize exports to INT8 (TensorRT / OpenVINO VNNI) instead of FP16
+INT8_CALIB_DATA = ""       # dataset yaml for INT8 calibration ("" = Ultralytics default)
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
@@ -49,7 +86,17 @@ EMAIL_PASSWORD = ""        # Gmail App Password (not your login password)
 EMAIL_RECEIVER = ""        # destination email
 
 ALERT_COOLDOWN_SEC = 30    # seconds between email sends
+SMTP_KEEPALIVE_SEC = 60    # idle seconds between NOOPs on the persistent SMTP session
 VIDEO_SAMPLE_FRAMES = 100  # frames to scan in uploaded videos before stopping
+VIDEO_JOB_WORKERS = 2      # uploaded videos processed concurrently (they share the batcher with streams)
+JOB_HISTORY = 100          # finished video jobs / annotated images kept (with their output files)
+STREAM_QUEUE_SIZE = 2      # frames buffered between stream pipeline stages
+MAX_BATCH_SIZE = 4         # max frames coalesced into one inference call
+BATCH_WINDOW_MS = 5        # how long the batcher waits for more frames
+JPEG_QUALITY = 75          # MJPEG stream frame quality
+MOTION_THRESHOLD = 2.0     # mean abs diff (0-255) of stream thumbnails below which a frame is "static"
+MAX_SKIP_MS = 500          # re-run detection at least this often, even on a static scene
+MAX_GRAB_STRIDE = 8        # most frames the capture stage skips per read when inference lags
 
 
 # Weapon keyword list
@@ -66,6 +113,84 @@ CONFIDENCE_THRESHOLD = 0.25
 # ------------------------------------------------------------------
 # Model loader w/ fallback
 # ------------------------------------------------------------------
+def _export_candidates(path: str):
+    """
+    Yield (format, cached_target, export_kwargs) to try for this host, best first.
+    """
+    # input size and max batch are part of the cache name, so changing
+    # MODEL_IMGSZ / MAX_BATCH_SIZE (or an old static export) forces a rebuild
+    stem = f"{os.path.splitext(path)[0]}_{MODEL_IMGSZ}_b{MAX_BATCH_SIZE}"
+    precision = "_int8" if EXPORT_INT8 else ""
+    if EXPORT_INT8:
+        quant = {"int8": True}
+        if INT8_CALIB_DATA:
+            quant["data"] = INT8_CALIB_DATA
+    else:
+        quant = {"half": True}
+    # dynamic batch so the batcher can send up to MAX_BATCH_SIZE frames per call
+    batching = {"dynamic": True, "batch": MAX_BATCH_SIZE}
+
+    if torch.cuda.is_available():
+        # skip the engine when TensorRT is absent: the attempt would redo an ONNX
+        # export and Ultralytics' tensorrt auto-install on every start
+        if importlib.util.find_spec("tensorrt") is not None:
+            yield "engine", f"{stem}{precision}.engine", {"workspace": 4, **quant, **batching}
+        # portable fallback: ONNX Runtime's CUDA EP (FP16). The exporter only
+        # runs on the GPU (required for half) when given a device, and the
+        # cache is named apart from <stem>.onnx, the FP32 intermediate the
+        # TensorRT export leaves behind.
+        yield "onnx", f"{stem}_fp16.onnx", {"device": 0, "half": True, "simplify": True, **batching}
+    else:
+        yield "openvino", f"{stem}{precision}_openvino_model", {**quant, **batching}
+
+def _runs_on_cuda(m: YOLO) -> bool:
+    """
+    True if the loaded backend actually executes on the GPU. Ultralytics/ONNX
+    Runtime quietly drop to CPUExecutionProvider when onnxruntime-gpu is
+    missing or doesn't match the host's CUDA/cuDNN.
+    """
+    backend = m.predictor.model
+    session = getattr(backend, "session", None)
+    if session is not None:
+        return "CUDAExecutionProvider" in session.get_providers()
+    return getattr(backend, "device", torch.device("cpu")).type == "cuda"
+
+def _load_accelerated(path: str) -> YOLO:
+    """
+    Export `path` to TensorRT or ONNX Runtime (CUDA hosts) / OpenVINO (CPU hosts)
+    and load the first export that works.
+    The export is cached next to the .pt, so it is only built on first start.
+    """
+    for fmt, target, kwargs in _export_candidates(path):
+        try:
+            if not os.path.exists(target):
+                print(f"[MODEL] Exporting {path} to {fmt} (one-time)...")
+                exported = YOLO(path).export(format=fmt, imgsz=MODEL_IMGSZ, **kwargs)
+                # exporters write next to the .pt under its own name; move it to the
+                # cache name that records precision, input size and batch
+                if os.path.abspath(exported) != os.path.abspath(target):
+                    os.replace(exported, target)
+
+            print(f"[MODEL] Loading accelerated model: {target}")
+            m = YOLO(target, task="detect")
+            # backends load lazily; run a full batch so a missing runtime or an
+            # export that can't take MAX_BATCH_SIZE frames fails here
+            m(torch.zeros((MAX_BATCH_SIZE, 3, MODEL_IMGSZ, MODEL_IMGSZ)), verbose=False)
+            if torch.cuda.is_available() and not _runs_on_cuda(m):
+                raise RuntimeError("backend fell back to the CPU")
+            return m
+        except Exception as e:
+            print(f"[MODEL] {fmt} export/load failed: {e}")
+    raise RuntimeError(f"no accelerated export of {path} could be loaded")
+
+def _load(path: str) -> YOLO:
+    if EXPORT_ACCELERATED:
+        try:
+            return _load_accelerated(path)
+        except Exception as e:
+            print(f"[MODEL] Accelerated export failed for {path}: {e}; using it as-is.")
+    return YOLO(path)
+
 def load_model_with_fallback() -> YOLO:
     """
     Try custom model first. If missing or load fails, fallback to YOLOv8n.
@@ -74,39 +199,265 @@ def load_model_with_fallback() -> YOLO:
     if os.path.exists(CUSTOM_MODEL) and os.path.getsize(CUSTOM_MODEL) > 0:
         try:
             print(f"[MODEL] Loading custom model: {CUSTOM_MODEL}")
-            return YOLO(CUSTOM_MODEL)
+            return _load(CUSTOM_MODEL)
         except Exception as e:
             print(f"[MODEL] Failed to load custom model: {e}")
 
     # Fallback
     print(f"[MODEL] Falling back to {FALLBACK_MODEL} (will auto-download if missing)...")
     try:
-        return YOLO(FALLBACK_MODEL)
+        return _load(FALLBACK_MODEL)
     except Exception as e:
         raise RuntimeError(f"Failed to load fallback model '{FALLBACK_MODEL}': {e}")
 
 model = load_model_with_fallback()
 
+# ------------------------------------------------------------------
+# Preprocessing
+# ------------------------------------------------------------------
+_DEVICE = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+
+# FP16 halves activation bandwidth and uses tensor cores on CUDA; CPU stays FP32.
+# verbose=False drops Ultralytics' per-call log line. imgsz is pinned to the
+# size _Letterbox produces (and exports are built for).
+_PREDICT_KWARGS = {"half": _DEVICE.type == "cuda", "imgsz": MODEL_IMGSZ, "verbose": False}
+
+# TF32 for any FP32 matmuls/convs left on Ampere+ (no-op elsewhere)
+torch.set_float32_matmul_precision("high")
+
+class _Letterbox:
+    """
+    Letterboxes frames of one fixed size into a 1x3xSxS float tensor for the
+    model, the same way Ultralytics' LetterBox does (centered, pad 114).
+
+    The resize/pad parameters are computed once and every frame is written
+    into the same OpenCV buffers, so the batch worker can hand the tensor
+    straight to the predictor, skipping Ultralytics' per-call letterbox,
+    BGR->RGB, HWC->CHW and normalization.
+
+    On CUDA the RGB buffer lives in pinned host memory and is uploaded as
+    uint8 with a non-blocking copy; the float conversion runs on the device.
+    """
+
+    def __init__(self, height: int, width: int, size: int = MODEL_IMGSZ):
+        self.shape = (height, width)
+        self.gain = min(size / height, size / width)
+        new_w, new_h = round(width * self.gain), round(height * self.gain)
+        self.new_size = (new_w, new_h)
+        self.top = round((size - new_h) / 2 - 0.1)
+        self.left = round((size - new_w) / 2 - 0.1)
+        self._resized = np.empty((new_h, new_w, 3), dtype=np.uint8)
+        self._padded = np.full((size, size, 3), 114, dtype=np.uint8)
+        self._copied = None
+        if _DEVICE.type == "cuda":
+            self._pinned = torch.empty((size, size, 3), dtype=torch.uint8).pin_memory()
+            self._rgb = self._pinned.numpy()
+        else:
+            self._pinned = None
+            self._rgb = np.empty((size, size, 3), dtype=np.uint8)
+
+    def __call__(self, frame: np.ndarray) -> torch.Tensor:
+        new_w, new_h = self.new_size
+        if (frame.shape[1], frame.shape[0]) == self.new_size:
+            resized = frame
+        else:
+            resized = cv2.resize(frame, self.new_size, dst=self._resized, interpolation=cv2.INTER_LINEAR)
+        self._padded[self.top:self.top + new_h, self.left:self.left + new_w] = resized
+        if self._copied is not None:
+            # The previous frame's async upload may still be reading the pinned buffer
+            self._copied.synchronize()
+        cv2.cvtColor(self._padded, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        if self._pinned is not None:
+            tensor = self._pinned.to(_DEVICE, non_blocking=True)
+            self._copied = torch.cuda.Event()
+            self._copied.record()
+        else:
+            tensor = torch.from_numpy(self._rgb)
+        # .float() copies, so the returned tensor never aliases the reused buffers
+        return tensor.permute(2, 0, 1).unsqueeze(0).float().div_(255.0)
+
+# ------------------------------------------------------------------
+# Batched inference
+# ------------------------------------------------------------------
+# All inference goes through one worker thread, which coalesces frames
+# submitted by concurrent streams/uploads into a single batch.
+_infer_queue = queue.Queue()
+
+def _infer_submit(tensor: torch.Tensor, frame: np.ndarray) -> Future:
+    """
+    Queue a letterboxed 1x3xSxS tensor of `frame` for inference; the future
+    resolves to a one-element results list with boxes in `frame` coordinates.
+    """
+    fut = Future()
+    _infer_queue.put((tensor, frame, fut))
+    return fut
+
+def _predict_batch(batch) -> list:
+    """
+    Run the predictor's backend + NMS on a batch of letterboxed tensors.
+
+    model(tensor) would route through Ultralytics' LoadTensor/postprocess,
+    which syncs on im.max() and copies every 640x640 input back to the host
+    as its "original" image; here the real frames are passed instead and
+    Ultralytics scales the boxes onto them. Needs the predictor set up by
+    _warmup (same _PREDICT_KWARGS).
+    """
+    if model.predictor is None:
+        # warm-up failed; let Ultralytics set it up (re-raises if it still fails)
+        model(torch.zeros((1, 3, MODEL_IMGSZ, MODEL_IMGSZ), device=_DEVICE), **_PREDICT_KWARGS)
+    predictor = model.predictor
+    frames = [frame for _, frame, _ in batch]
+    im = torch.cat([tensor for tensor, _, _ in batch])
+    # postprocess only reads the source paths (batch[0]) of the current batch
+    predictor.batch = ([""] * len(batch), frames, "")
+    with torch.inference_mode():
+        preds = predictor.inference(im.half() if predictor.model.fp16 else im)
+        return predictor.postprocess(preds, im, frames)
+
+def _batch_worker():
+    # warm up here rather than on the import thread: CUDA graphs recorded by
+    # torch.compile(mode="reduce-overhead") belong to the thread that made them
+    _warmup()
+    while True:
+        batch = [_infer_queue.get()]
+        deadline = time.monotonic() + BATCH_WINDOW_MS / 1000
+        while len(batch) < MAX_BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(_infer_queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+        try:
+            results = _predict_batch(batch)
+        except Exception as e:
+            for _, _, fut in batch:
+                fut.set_exception(e)
+            continue
+        for i, (_, _, fut) in enumerate(batch):
+            fut.set_result(results[i:i + 1])
+
+def _warmup():
+    """
+    Run one dummy inference at startup so backend setup (OpenVINO/TensorRT
+    graph compilation, predictor init) isn't paid by the first real request.
+    Called on the batch worker thread before it takes any jobs; requests
+    submitted meanwhile wait in the queue.
+    """
+    try:
+        model(torch.zeros((1, 3, MODEL_IMGSZ, MODEL_IMGSZ), device=_DEVICE), **_PREDICT_KWARGS)
+    except Exception as e:
+        print(f"[MODEL] Warm-up failed: {e}")
+        return
+    if COMPILE_EAGER and isinstance(model.model, torch.nn.Module):
+        _compile_eager()
+
+def _compile_eager():
+    """
+    torch.compile the eager PyTorch network and trace every batch size the
+    batcher can send, so compilation happens here rather than on live frames.
+
+    The network compiled is the one inside the predictor's AutoBackend, i.e.
+    after Ultralytics has fused conv+bn and cast to FP16.
+    """
+    backend = model.predictor.model
+    eager = backend.model
+    try:
+        print("[MODEL] Compiling PyTorch model with torch.compile (one-time)...")
+        backend.model = torch.compile(eager, mode="reduce-overhead")
+        for n in range(1, MAX_BATCH_SIZE + 1):
+            model(torch.zeros((n, 3, MODEL_IMGSZ, MODEL_IMGSZ), device=_DEVICE), **_PREDICT_KWARGS)
+    except Exception as e:
+        print(f"[MODEL] torch.compile failed: {e}; running eagerly.")
+        backend.model = eager
+
+threading.Thread(target=_batch_worker, daemon=True).start()
+
 # ------------------------------------------------------------------
 # Detection state shared w/ /detection-status
 # ------------------------------------------------------------------
+# A single bool assignment/read is atomic under the GIL, so the flag that is
+# written every stream frame and polled by /detection-status needs no lock.
 _detection_flag = False
-_detection_lock = threading.Lock()
-_last_alert_time = 0.0
+
+# The alert cooldown is a read-modify-write and keeps its own small lock.
+_alert_lock = threading.Lock()
+_last_alert_time = float("-inf")  # time.monotonic() of the last email
 
 def _set_detected(flag: bool):
     global _detection_flag
-    with _detection_lock:
-        _detection_flag = flag
+    _detection_flag = flag
 
 def _get_detected() -> bool:
-    with _detection_lock:
-        return _detection_flag
+    return _detection_flag
+
+def _alert_due() -> bool:
+    """
+    Claim the next alert if ALERT_COOLDOWN_SEC has passed since the last one.
+    """
+    global _last_alert_time
+    # Unlocked fast path: reading a float is atomic, and during the cooldown
+    # (i.e. almost every weapon frame) there is nothing to update.
+    if time.monotonic() - _last_alert_time <= ALERT_COOLDOWN_SEC:
+        return False
+    with _alert_lock:
+        now = time.monotonic()
+        if now - _last_alert_time > ALERT_COOLDOWN_SEC:
+            _last_alert_time = now
+            return True
+        return False
 
 # ------------------------------------------------------------------
 # Email alert
 # ------------------------------------------------------------------
-def _send_email_alert():
+# One background event loop owns a long-lived SMTP session; callers just
+# enqueue a message, so no thread start or TLS handshake on the hot path.
+_alert_loop = asyncio.new_event_loop()
+_alert_queue = asyncio.Queue()
+
+async def _smtp_connect() -> aiosmtplib.SMTP:
+    smtp = aiosmtplib.SMTP(hostname="smtp.gmail.com", port=465, use_tls=True)
+    await smtp.connect()
+    await smtp.login(EMAIL_SENDER, EMAIL_PASSWORD)
+    return smtp
+
+async def _alert_worker():
+    smtp = None
+    while True:
+        try:
+            msg = await asyncio.wait_for(_alert_queue.get(), timeout=SMTP_KEEPALIVE_SEC)
+        except asyncio.TimeoutError:
+            # idle: a NOOP keeps the session alive; drop it if the server already hung up
+            if smtp is not None:
+                try:
+                    await smtp.noop()
+                except Exception:
+                    smtp.close()
+                    smtp = None
+            continue
+
+        for attempt in range(2):
+            try:
+                if smtp is None or not smtp.is_connected:
+                    smtp = await _smtp_connect()
+                await smtp.send_message(msg)
+                print("[ALERT] Email sent.")
+                break
+            except aiosmtplib.SMTPServerDisconnected as e:
+                # stale session: reconnect once and retry the same message
+                smtp = None
+                if attempt:
+                    print(f"[ALERT] Email error: {e}")
+            except Exception as e:
+                print(f"[ALERT] Email error: {e}")
+                if smtp is not None:
+                    smtp.close()
+                smtp = None  # reconnect on the next alert
+                break
+
+def _send_email_async():
     if not EMAIL_SENDER or not EMAIL_PASSWORD or not EMAIL_RECEIVER:
         print("[ALERT] Email config missing; not sending.")
         return
@@ -115,120 +466,526 @@ def _send_email_alert():
     msg["From"] = EMAIL_SENDER
     msg["To"] = EMAIL_RECEIVER
     msg.set_content("⚠ A weapon was detected by the surveillance system.")
-    try:
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465) as smtp:
-            smtp.login(EMAIL_SENDER, EMAIL_PASSWORD)
-            smtp.send_message(msg)
-        print("[ALERT] Email sent.")
-    except Exception as e:
-        print(f"[ALERT] Email error: {e}")
+    _alert_loop.call_soon_threadsafe(_alert_queue.put_nowait, msg)
 
-def _send_email_async():
-    threading.Thread(target=_send_email_alert, daemon=True).start()
+threading.Thread(
+    target=_alert_loop.run_until_complete, args=(_alert_worker(),), daemon=True
+).start()
 
 # ------------------------------------------------------------------
 # YOLO helpers
 # ------------------------------------------------------------------
-def _weapon_in_results(results) -> bool:
+def _is_weapon_label(label: str) -> bool:
     """
-    Returns True if any detection label contains our weapon keywords.
+    True if the lowercased label contains any weapon keyword.
     """
-    r = results[0]
-    names = model.names
-    for b in r.boxes:
-        cls = int(b.cls[0])
-        label = names.get(cls, "").lower()
-        if any(kw in label for kw in WEAPON_KEYWORDS):
-            return True
-    return False
+    return any(kw in label for kw in WEAPON_KEYWORDS)
+
+# Per-class lookups for the loaded model, resolved once instead of per box
+_CLS_NAME_LOWER = {i: n.lower() for i, n in model.names.items()}
+_WEAPON_CLS_IDS = frozenset(i for i, n in _CLS_NAME_LOWER.items() if _is_weapon_label(n))
+
+def _scan(results, conf_thresh: float = CONFIDENCE_THRESHOLD):
+    """
+    Single pass over the boxes above conf_thresh, copied to the host in one go.
+    Returns (detections_list with class name and confidence, weapon_found_bool,
+    rows) where rows are [x1, y1, x2, y2, conf, cls] for drawing.
+    """
+    boxes = results[0].boxes
+    rows = boxes.data[boxes.conf >= conf_thresh].tolist()
 
-def _extract_detections(results, conf_thresh: float = CONFIDENCE_THRESHOLD):
-    """Return list of detections with class name and confidence (filtered by threshold)."""
-    r = results[0]
-    names = model.names
     detections = []
-    for b in r.boxes:
-        try:
-            cls = int(b.cls[0])
-        except Exception:
-            cls = int(b.cls)
-        try:
-            conf = float(b.conf[0])
-        except Exception:
-            conf = float(getattr(b, "conf", 0.0))
-        label = names.get(cls, "").lower()
-        detections.append({"class": label, "confidence": conf})
-    # filter by confidence
-    return [d for d in detections if d["confidence"] >= conf_thresh]
-
-
-def _weapon_in_results(results, conf_thresh: float = CONFIDENCE_THRESHOLD) -> bool:
-    """Returns True if any detection label contains our weapon keywords (above conf_thresh)."""
-    detections = _extract_detections(results, conf_thresh)
-    for d in detections:
-        if any(kw in d["class"] for kw in WEAPON_KEYWORDS):
-            return True
-    return False
+    weapon_found = False
+    for row in rows:
+        c = int(row[-1])
+        detections.append({"class": _CLS_NAME_LOWER.get(c, ""), "confidence": row[-2]})
+        weapon_found = weapon_found or c in _WEAPON_CLS_IDS
+    return detections, weapon_found, rows
 
 
-def _annotate(frame: np.ndarray):
+def _annotate(frame: np.ndarray, letterbox: Optional[_Letterbox] = None):
     """
     Run YOLO on a BGR frame; return (annotated_frame, weapon_found_bool, detections_list).
+    Callers processing many frames of one size should pass a reusable letterbox.
+    """
+    if letterbox is None:
+        letterbox = _Letterbox(*frame.shape[:2])
+    results = _infer_submit(letterbox(frame), frame).result()
+    return _annotate_results(results, frame)
+
+def _annotate_results(results, frame: np.ndarray, in_place: bool = False):
+    """
+    Second half of _annotate, for callers that submitted the frame themselves.
+    With in_place=True boxes are drawn straight onto `frame` (no copy); only
+    for callers that don't need the raw frame afterwards.
     """
-    results = model(frame)
-    detections = _extract_detections(results)
-    weapon_found = any(any(kw in d["class"] for kw in WEAPON_KEYWORDS) for d in detections)
-    annotated = results[0].plot()
+    detections, weapon_found, rows = _scan(results)
+    annotated = _draw_fast(frame if in_place else frame.copy(), rows)
     return annotated, weapon_found, detections
 
+def _draw_fast(img: np.ndarray, rows) -> np.ndarray:
+    """
+    Draw scanned boxes onto img in place with plain cv2 primitives (weapons
+    red, everything else green); much cheaper than Results.plot().
+    """
+    for row in rows:
+        x1, y1, x2, y2 = (int(v) for v in row[:4])
+        cls = int(row[-1])
+        color = (0, 0, 255) if cls in _WEAPON_CLS_IDS else (0, 200, 0)
+        cv2.rectangle(img, (x1, y1), (x2, y2), color, 2)
+        label = f"{_CLS_NAME_LOWER.get(cls, '')} {row[-2]:.2f}"
+        cv2.putText(img, label, (x1, max(y1 - 6, 12)), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.5, color, 1, cv2.LINE_AA)
+    return img
+
 # ------------------------------------------------------------------
-# Streaming generator
+# JPEG encoding
 # ------------------------------------------------------------------
-def _stream_generator(source: Union[int, str]):
+_jpeg_local = threading.local()  # one TurboJPEG handle per encoding thread
+_JPEG_PARAMS = [
+    cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY,
+    cv2.IMWRITE_JPEG_OPTIMIZE, 0,     # no extra Huffman-optimization pass
+    cv2.IMWRITE_JPEG_PROGRESSIVE, 0,  # baseline: single scan, cheapest to encode/decode
+]
+
+def _probe_nvjpeg() -> bool:
     """
-    MJPEG generator for webcam or RTSP.
+    True if torchvision can JPEG-encode on the GPU (nvJPEG, torchvision >= 0.19).
     """
-    global _last_alert_time
+    if _DEVICE.type != "cuda":
+        return False
+    try:
+        encode_jpeg(torch.zeros((3, 16, 16), dtype=torch.uint8, device=_DEVICE))
+        return True
+    except Exception:
+        return False
+
+_NVJPEG = _probe_nvjpeg()
+
+def _encode_jpeg(frame: np.ndarray) -> Optional[bytes]:
+    """
+    Encode a BGR frame on the GPU with nvJPEG if available, else with
+    libjpeg-turbo (SIMD), else cv2.imencode. Returns None if encoding failed.
+    """
+    if _NVJPEG:
+        # BGR HWC -> RGB CHW on the device; only the compressed bytes come back
+        chw = torch.from_numpy(frame).to(_DEVICE).permute(2, 0, 1).flip(0).contiguous()
+        return encode_jpeg(chw, quality=JPEG_QUALITY).cpu().numpy().tobytes()
+
+    if TurboJPEG is not None:
+        tj = getattr(_jpeg_local, "tj", None)
+        if tj is None:
+            tj = _jpeg_local.tj = TurboJPEG()
+        return tj.encode(frame, quality=JPEG_QUALITY, pixel_format=TJPF_BGR)
+
+    ok, buf = cv2.imencode(".jpg", frame, _JPEG_PARAMS)
+    return buf.tobytes() if ok else None
+
+# ------------------------------------------------------------------
+# Video capture / writing (hardware decode & encode when available)
+# ------------------------------------------------------------------
+def _opencv_has_gstreamer() -> bool:
+    return any(
+        cv2.videoio_registry.getBackendName(b) == "GSTREAMER"
+        for b in cv2.videoio_registry.getBackends()
+    )
+
+@functools.lru_cache(maxsize=None)
+def _gst_has(element: str) -> bool:
+    """
+    True if the GStreamer element is installed (checked with gst-inspect-1.0).
+    """
+    exe = shutil.which("gst-inspect-1.0")
+    if exe is None:
+        return False
+    return subprocess.run([exe, "--exists", element], capture_output=True).returncode == 0
+
+def _pick_rtsp_decoder() -> Optional[str]:
+    """
+    Hardware H.264 decoder element to use for RTSP: NVDEC, then VA-API, else None.
+    """
+    if not _opencv_has_gstreamer():
+        return None
+    for element in ("nvh264dec", "vaapih264dec"):
+        if _gst_has(element):
+            print(f"[STREAM] Hardware RTSP decode via GStreamer {element}")
+            return element
+    return None
+
+_RTSP_GST_DECODER = _pick_rtsp_decoder()
+
+class _AVCapture:
+    """
+    Minimal cv2.VideoCapture stand-in that decodes with PyAV/FFmpeg, on the
+    GPU (NVDEC) when given a `hwaccel`. Implements only what the stream
+    pipeline and video uploads use.
+    """
+
+    def __init__(self, url: str, options: Optional[dict] = None, hwaccel=None):
+        self._container = av.open(url, options=options or {}, hwaccel=hwaccel)
+        stream = self._container.streams.video[0]
+        if hwaccel is None:
+            stream.thread_type = "AUTO"  # frame + slice threaded software decode
+        self._frames = self._container.decode(stream)
+
+    def isOpened(self) -> bool:
+        return self._container is not None
+
+    def rotated(self) -> bool:
+        """
+        True if the video carries rotation metadata (e.g. portrait phone
+        clips). Peeks at the first frame, which read()/grab() still return.
+        """
+        stream = self._container.streams.video[0]
+        if stream.metadata.get("rotate", "0") not in ("0", ""):
+            return True
+        try:
+            first = next(self._frames)
+        except (StopIteration, av.error.FFmpegError):
+            return False
+        self._frames = itertools.chain([first], self._frames)
+        rotation = getattr(first, "rotation", None)
+        if rotation is not None:
+            return rotation % 360 != 0
+        return any(getattr(sd.type, "name", "") == "DISPLAYMATRIX" for sd in first.side_data)
+
+    def grab(self) -> bool:
+        # decoding can't be skipped, but the download/BGR conversion can
+        try:
+            next(self._frames)
+        except (StopIteration, av.error.FFmpegError):
+            return False
+        return True
+
+    def read(self, image=None):
+        # PyAV can't decode into an existing array, so `image` is ignored
+        try:
+            frame = next(self._frames)
+        except (StopIteration, av.error.FFmpegError):
+            return False, None
+        return True, frame.to_ndarray(format="bgr24")
+
+    def get(self, prop_id) -> float:
+        stream = self._container.streams.video[0]
+        if prop_id == cv2.CAP_PROP_FPS:
+            rate = stream.average_rate
+            return float(rate) if rate else 0.0
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(stream.codec_context.width)
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(stream.codec_context.height)
+        return 0.0
+
+    def set(self, prop_id, value) -> bool:
+        return False
+
+    def release(self):
+        if self._container is not None:
+            self._container.close()
+            self._container = None
+
+def _open_capture(source: Union[int, str]) -> cv2.VideoCapture:
+    """
+    Open a stream source. RTSP URLs are hardware-decoded when possible: via a
+    GStreamer pipeline if one was detected at startup, else via PyAV's CUDA
+    hwaccel. Anything else (or if those fail to open) uses OpenCV's default backend.
+    """
+    is_rtsp = isinstance(source, str) and source.lower().startswith("rtsp://")
+    if (
+        _RTSP_GST_DECODER
+        and is_rtsp
+        and '"' not in source  # the URL is quoted inside the pipeline string
+    ):
+        pipeline = (
+            f'rtspsrc location="{source}" latency=0 ! rtph264depay ! h264parse ! '
+            f"{_RTSP_GST_DECODER} ! videoconvert ! video/x-raw,format=BGR ! "
+            "appsink drop=1 max-buffers=1 sync=0"
+        )
+        cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+        if cap.isOpened():
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            return cap
+        cap.release()
+        print("[STREAM] GStreamer pipeline failed to open; using default decoder.")
+
+    if is_rtsp and av is not None and torch.cuda.is_available():
+        try:
+            return _AVCapture(
+                source,
+                options={"rtsp_transport": "tcp", "fflags": "nobuffer"},
+                hwaccel=HWAccel(device_type="cuda", allow_software_fallback=False),
+            )
+        except Exception as e:
+            print(f"[STREAM] PyAV CUDA decode unavailable ({e}); using default decoder.")
+
     cap = cv2.VideoCapture(source)
-    if not cap.isOpened():
-        print(f"[STREAM] Unable to open source: {source}")
-        return
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return cap
+
+def _open_video_file(path: str):
+    """
+    Open an uploaded video. Decodes with PyAV (NVDEC when CUDA is available,
+    falling back to threaded software decode) so frames skip OpenCV's own
+    capture layer; uses cv2.VideoCapture if PyAV is missing or can't open it.
+
+    Rotated videos also go to OpenCV, which applies the display matrix
+    (CAP_PROP_ORIENTATION_AUTO) where bgr24 frames from PyAV would come out
+    sideways.
+    """
+    if av is not None:
+        hwaccel = None
+        if torch.cuda.is_available():
+            hwaccel = HWAccel(device_type="cuda", allow_software_fallback=True)
+        try:
+            cap = _AVCapture(path, hwaccel=hwaccel)
+            if not cap.rotated():
+                return cap
+            cap.release()
+        except Exception as e:
+            print(f"[VIDEO] PyAV could not open {path} ({e}); using OpenCV.")
+    return cv2.VideoCapture(path)
 
+def _pick_h264_encoder() -> Optional[str]:
+    """
+    Hardware H.264 encoder element for upload output: NVENC, then VA-API, else None.
+    """
+    if not _opencv_has_gstreamer():
+        return None
+    for element in ("nvh264enc", "vaapih264enc"):
+        if _gst_has(element):
+            print(f"[VIDEO] Hardware video encode via GStreamer {element}")
+            return element
+    return None
+
+_GST_H264_ENCODER = _pick_h264_encoder()
+
+def _open_writer(out_path: str, fps: float, size) -> cv2.VideoWriter:
+    """
+    Open the annotated-video writer: hardware H.264 through GStreamer when an
+    encoder was detected at startup, otherwise OpenCV's software mp4v writer.
+    """
+    if _GST_H264_ENCODER and '"' not in out_path:
+        encoder = _GST_H264_ENCODER
+        if encoder == "nvh264enc":
+            encoder += " preset=low-latency-hq"
+        pipeline = (
+            f"appsrc ! videoconvert ! {encoder} ! h264parse ! mp4mux ! "
+            f'filesink location="{out_path}"'
+        )
+        writer = cv2.VideoWriter(pipeline, cv2.CAP_GSTREAMER, 0, fps, size)
+        if writer.isOpened():
+            return writer
+        writer.release()
+        print("[VIDEO] GStreamer writer failed to open; using mp4v.")
+
+    return cv2.VideoWriter(out_path, cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+
+# ------------------------------------------------------------------
+# Streaming pipeline
+# ------------------------------------------------------------------
+def _put_latest(q: queue.Queue, item):
+    """
+    Non-blocking put; when the queue is full the oldest item is dropped so
+    downstream stages always work on the most recent frame.
+    Returns the dropped item (or None).
+    """
+    dropped = None
     while True:
-        ok, frame = cap.read()
-        if not ok:
-            print("[STREAM] Frame read failed; ending stream.")
-            break
-
-        annotated, weapon_found, detections = _annotate(frame)
-
-        if weapon_found:
-            _set_detected(True)
-            with _detection_lock:
-                if time.time() - _last_alert_time > ALERT_COOLDOWN_SEC:
-                    _last_alert_time = time.time()
+        try:
+            q.put_nowait(item)
+            return dropped
+        except queue.Full:
+            try:
+                dropped = q.get_nowait()
+            except queue.Empty:
+                pass
+
+def _capture_frames(cap: cv2.VideoCapture, frames_q: queue.Queue, free_q: queue.Queue,
+                    stats: dict, stop: threading.Event):
+    """
+    Stage 1: read frames from the source. Always ends with a None sentinel and
+    sets `stop` (also when it fails), so the other stages wind down too.
+
+    Frame buffers are recycled through free_q (filled by the inference stage)
+    so cap.read() decodes into an existing array instead of allocating one.
+    Frames that would arrive while the detector is still busy are only
+    grab()bed, skipping their retrieve/BGR conversion.
+    """
+    # OpenCV's FFmpeg backend can report a timebase (e.g. 90000) as the fps of
+    # RTSP streams and GStreamer reports 0; outside a plausible range the frame
+    # interval is measured from read timing instead
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    interval = 1.0 / fps if 1 <= fps <= 120 else 0.0
+    measured = interval == 0.0
+    try:
+        while not stop.is_set():
+            stride = 1
+            if interval > 0:
+                stride = min(MAX_GRAB_STRIDE, max(1, int(stats["latency"] / interval)))
+            started = time.monotonic()
+            ok = all(cap.grab() for _ in range(stride - 1))
+            try:
+                buf = free_q.get_nowait()
+            except queue.Empty:
+                buf = None
+            if ok:
+                ok, frame = cap.read(buf)
+            if not ok:
+                print("[STREAM] Frame read failed; ending stream.")
+                break
+            if measured:
+                per_frame = (time.monotonic() - started) / stride
+                interval = per_frame if interval == 0 else 0.9 * interval + 0.1 * per_frame
+            dropped = _put_latest(frames_q, frame)
+            if dropped is not None:
+                free_q.put(dropped)
+    except Exception as e:
+        print(f"[STREAM] Capture failed: {e}")
+    finally:
+        cap.release()
+        stop.set()
+        _put_latest(frames_q, None)
+
+def _thumbnail(frame: np.ndarray) -> np.ndarray:
+    """
+    64x64 grayscale thumbnail used for cheap frame-difference checks.
+    """
+    return cv2.cvtColor(cv2.resize(frame, (64, 64), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+
+def _infer_frames(frames_q: queue.Queue, annotated_q: queue.Queue, free_q: queue.Queue,
+                  stats: dict, stop: threading.Event):
+    """
+    Stage 2: run detection, update the detection flag and alert. Always ends
+    with a None sentinel and sets `stop`.
+
+    Frames that barely differ from the last inferred one reuse its annotation
+    (for at most MAX_SKIP_MS), so static scenes don't cost a model call each.
+    """
+    annotated, weapon_found = None, False
+    last_small, last_infer = None, 0.0
+    letterbox = None
+    try:
+        while not stop.is_set():
+            frame = frames_q.get()
+            if frame is None:
+                break
+
+            small = _thumbnail(frame)
+            now = time.monotonic()
+            static = (
+                last_small is not None
+                and (now - last_infer) * 1000 < MAX_SKIP_MS
+                and cv2.absdiff(small, last_small).mean() < MOTION_THRESHOLD
+            )
+            if not static:
+                if letterbox is None or letterbox.shape != frame.shape[:2]:
+                    letterbox = _Letterbox(*frame.shape[:2])
+                annotated, weapon_found, detections = _annotate(frame, letterbox)
+                last_small, last_infer = small, now
+                # EMA of detector latency, read by the capture stage to pick its stride
+                stats["latency"] = 0.8 * stats["latency"] + 0.2 * (time.monotonic() - now)
+
+            if weapon_found:
+                _set_detected(True)
+                if _alert_due():
                     _send_email_async()
-        else:
-            _set_detected(False)
+            else:
+                _set_detected(False)
 
-        ok_enc, buf = cv2.imencode(".jpg", annotated)
-        if not ok_enc:
-            continue
+            # annotated is a separate image, so the frame buffer can be reused
+            free_q.put(frame)
+            _put_latest(annotated_q, annotated)
+    except Exception as e:
+        print(f"[STREAM] Detection failed: {e}")
+    finally:
+        stop.set()
+        _put_latest(annotated_q, None)
 
-        yield (
-            b"--frame\r\n"
-            b"Content-Type: image/jpeg\r\n\r\n" +
-            buf.tobytes() +
-            b"\r\n"
-        )
+def _encode_frames(annotated_q: queue.Queue, chunks_q: queue.Queue, stop: threading.Event):
+    """
+    Stage 3: JPEG-encode annotated frames into multipart chunks. Always ends
+    with a None sentinel and sets `stop`.
+    """
+    last_annotated, last_chunk = None, None
+    try:
+        while not stop.is_set():
+            annotated = annotated_q.get()
+            if annotated is None:
+                break
+
+            # static scenes re-emit the same annotated image; reuse its encoding
+            if annotated is not last_annotated:
+                jpeg = _encode_jpeg(annotated)
+                if jpeg is None:
+                    continue
+                last_annotated = annotated
+                last_chunk = (
+                    b"--frame\r\n"
+                    b"Content-Type: image/jpeg\r\n\r\n" +
+                    jpeg +
+                    b"\r\n"
+                )
+            _put_latest(chunks_q, last_chunk)
+    except Exception as e:
+        print(f"[STREAM] JPEG encoding failed: {e}")
+    finally:
+        stop.set()
+        _put_latest(chunks_q, None)
+
+def _stream_generator(source: Union[int, str]):
+    """
+    MJPEG generator for webcam or RTSP.
+
+    Capture, inference and JPEG encoding each run in their own thread,
+    connected by bounded queues, so the stages overlap and throughput is set
+    by the slowest stage rather than the sum of all three. The generator
+    itself only hands finished chunks to the server. A stage that fails stops
+    the others and its sentinel reaches the generator, so the response ends
+    and the source is released.
+    """
+    cap = _open_capture(source)
+    if not cap.isOpened():
+        print(f"[STREAM] Unable to open source: {source}")
+        return
+
+    # capture -> inference holds only the newest frame: when inference falls
+    # behind, stale frames are replaced instead of queueing up latency
+    frames_q = queue.Queue(maxsize=1)
+    annotated_q = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    chunks_q = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    free_q = queue.Queue()
+    stats = {"latency": 0.0}  # seconds, shared between capture and inference
+    stop = threading.Event()
+    threading.Thread(target=_capture_frames, args=(cap, frames_q, free_q, stats, stop), daemon=True).start()
+    threading.Thread(target=_infer_frames, args=(frames_q, annotated_q, free_q, stats, stop), daemon=True).start()
+    threading.Thread(target=_encode_frames, args=(annotated_q, chunks_q, stop), daemon=True).start()
 
-    cap.release()
+    try:
+        while True:
+            chunk = chunks_q.get()
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        # client disconnected or source ended: let the worker threads wind down
+        stop.set()
 
 # ------------------------------------------------------------------
 # Upload detection (image or video)
 # ------------------------------------------------------------------
-def _detect_image(path: str):
+# Uploaded inputs are deleted once processed; outputs are kept for the last
+# JOB_HISTORY uploads of each kind so /uploads/<name> can still serve them.
+_image_outputs = collections.deque()  # annotated image paths, oldest first
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _detect_image(path: str, upload_id: str):
     img = cv2.imread(path)
+    _remove_file(path)
     if img is None:
         return jsonify({"error": "Cannot read image."}), 400
 
@@ -237,8 +994,11 @@ def _detect_image(path: str):
         _set_detected(True)
         _send_email_async()
 
-    out_path = os.path.join(UPLOAD_DIR, "detected.jpg")
+    out_path = os.path.join(UPLOAD_DIR, f"detected_{upload_id}.jpg")
     cv2.imwrite(out_path, annotated)
+    _image_outputs.append(out_path)
+    while len(_image_outputs) > JOB_HISTORY:
+        _remove_file(_image_outputs.popleft())
     
     # Return JSON with file path instead of binary data
     message = "Weapon detected in image!" if weapon_found else "No weapon detected in image."
@@ -249,46 +1009,98 @@ def _detect_image(path: str):
         "detections": detections
     })
 
-def _detect_video(path: str):
-    cap = cv2.VideoCapture(path)
-    if not cap.isOpened():
-        return jsonify({"error": "Cannot open video."}), 400
-
-    found = False
-    frames = 0
-    out_path = os.path.join(UPLOAD_DIR, "detected.mp4")
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    fps = cap.get(cv2.CAP_PROP_FPS) or 20
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    writer = cv2.VideoWriter(out_path, fourcc, fps, (width, height))
-    while cap.isOpened() and frames < VIDEO_SAMPLE_FRAMES:
-        ok, frame = cap.read()
-        if not ok:
-            break
-        annotated, weapon_found, detections = _annotate(frame)
-        writer.write(annotated)
-        if weapon_found:
-            found = True
-            break
-        frames += 1
-    cap.release()
-    writer.release()
+# Uploaded videos are processed in the background; /upload returns a job id
+# and the result is polled from /upload/status/<job_id>.
+_video_pool = ThreadPoolExecutor(max_workers=VIDEO_JOB_WORKERS)
+_jobs = {}  # job_id -> Future resolving to the result payload
+
+def _video_output_path(job_id: str) -> str:
+    return os.path.join(UPLOAD_DIR, f"detected_{job_id}.mp4")
+
+def _run_video_job(path: str, out_path: str) -> dict:
+    try:
+        return _process_video(path, out_path)
+    finally:
+        _remove_file(path)
+
+def _process_video(path: str, out_path: str) -> dict:
+    cap = _open_video_file(path)
+    writer = None
+    try:
+        if not cap.isOpened():
+            return {"error": "Cannot open video."}
+
+        found = False
+        frames = 0
+        fps = cap.get(cv2.CAP_PROP_FPS) or 20
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        writer = _open_writer(out_path, fps, (width, height))
+        # Frames are submitted MAX_BATCH_SIZE at a time so the batch worker can run
+        # them through one inference call; each slot reuses its own read buffer
+        # (with OpenCV; PyAV returns a fresh array per frame).
+        bufs = [np.empty((height, width, 3), dtype=np.uint8) for _ in range(MAX_BATCH_SIZE)]
+        letterbox = None
+        eof = False
+        while not found and not eof and frames < VIDEO_SAMPLE_FRAMES:
+            pending = []
+            for i in range(min(MAX_BATCH_SIZE, VIDEO_SAMPLE_FRAMES - frames)):
+                ok, bufs[i] = cap.read(bufs[i])
+                if not ok:
+                    eof = True
+                    break
+                if letterbox is None:
+                    letterbox = _Letterbox(*bufs[i].shape[:2])
+                pending.append((bufs[i], _infer_submit(letterbox(bufs[i]), bufs[i])))
+
+            for frame, fut in pending:
+                # draw onto the read buffer itself; it is written out before being reused
+                annotated, weapon_found, detections = _annotate_results(
+                    fut.result(), frame, in_place=True
+                )
+                writer.write(annotated)
+                if weapon_found:
+                    found = True
+                    break
+                frames += 1
+    finally:
+        # also on failure: finalize the output file and close the input before
+        # _run_video_job deletes it (an open file can't be removed on Windows)
+        cap.release()
+        if writer is not None:
+            writer.release()
     if found:
         _set_detected(True)
         _send_email_async()
-        return jsonify({
+        return {
             "message": "Weapon detected in video.",
             "output": out_path,
             "detected": True,
             "detections": detections
-        })
+        }
     else:
-        return jsonify({
+        return {
             "message": "No weapon detected in sampled frames.",
             "output": out_path,
             "detected": False
-        })
+        }
+
+def _forget_old_jobs():
+    finished = [job_id for job_id, fut in list(_jobs.items()) if fut.done()]
+    for job_id in finished[:max(0, len(_jobs) - JOB_HISTORY)]:
+        _jobs.pop(job_id, None)
+        _remove_file(_video_output_path(job_id))
+
+def _detect_video(path: str, job_id: str):
+    out_path = _video_output_path(job_id)
+    _forget_old_jobs()
+    _jobs[job_id] = _video_pool.submit(_run_video_job, path, out_path)
+    return jsonify({
+        "message": "Video queued for detection.",
+        "job_id": job_id,
+        "status": "running",
+        "status_url": f"/upload/status/{job_id}"
+    }), 202
 
 # ------------------------------------------------------------------
 # Routes
@@ -320,17 +1132,35 @@ def upload():
     if not f.filename:
         return jsonify({"error": "Empty filename"}), 400
 
-    save_path = os.path.join(UPLOAD_DIR, f.filename)
+    # unique per upload, so concurrent uploads never overwrite each other's input/output
+    upload_id = uuid.uuid4().hex
+    save_path = os.path.join(UPLOAD_DIR, f"{upload_id}_{secure_filename(f.filename)}")
     f.save(save_path)
 
     ext = os.path.splitext(f.filename)[1].lower()
     if ext in (".jpg", ".jpeg", ".png", ".bmp", ".webp"):
-        return _detect_image(save_path)
+        return _detect_image(save_path, upload_id)
     elif ext in (".mp4", ".avi", ".mov", ".mkv", ".wmv"):
-        return _detect_video(save_path)
+        return _detect_video(save_path, upload_id)
     else:
+        _remove_file(save_path)
         return jsonify({"error": f"Unsupported file type: {ext}"}), 400
 
+@app.route("/upload/status/<job_id>", methods=["GET"])
+def upload_status(job_id):
+    fut = _jobs.get(job_id)
+    if fut is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    if not fut.done():
+        return jsonify({"job_id": job_id, "status": "running"})
+    try:
+        result = fut.result()
+    except Exception as e:
+        return jsonify({"job_id": job_id, "status": "failed", "error": str(e)}), 500
+    if "error" in result:
+        return jsonify({"job_id": job_id, "status": "failed", **result}), 400
+    return jsonify({"job_id": job_id, "status": "done", **result})
+
 @app.route("/video")
 def video():
     # laptop webcam index 0
@@ -353,4 +1183,6 @@ def cctv():
 # Main
 # ------------------------------------------------------------------
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=False)
+    # dev server: one thread per request so /detection-status polls and uploads
+    # aren't queued behind long-lived MJPEG streams (production: gunicorn.conf.py)
+    app.run(host="0.0.0.0", port=5000, debug=False, threaded=True)
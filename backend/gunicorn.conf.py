@@ -0,0 +1,24 @@
+"""
+Gunicorn settings for the detection backend.
+
+A single worker process loads the model and owns the GPU; concurrency comes
+from threads, which all share that model and its batched inference queue.
+More worker processes would each load their own copy of the model (and
+CUDA context), and fork-after-CUDA-init is not supported by PyTorch.
+
+Run:
+  gunicorn -c gunicorn.conf.py app:app
+"""
+
+import os
+
+bind = "0.0.0.0:5000"
+workers = 1
+worker_class = "gthread"
+# Each open /video or /cctv stream holds a thread for as long as the client
+# watches, so size this to concurrent streams + status polls/uploads.
+threads = int(os.environ.get("GUNICORN_THREADS", 16))
+# The worker imports app.py (and builds the TensorRT/OpenVINO export on first
+# start, which can take minutes) before it heartbeats; don't let the arbiter
+# kill it during that.
+timeout = 0
@@ -1,8 +1,54 @@
+# Training + pruning script. Needs the training extras on top of the app's
+# dependencies:
+#   pip install -r requirements-train.txt
+import torch
+import torch_pruning as tp
 from ultralytics import YOLO
+from ultralytics.models.yolo.detect import DetectionTrainer
+from ultralytics.nn.modules import Detect
+
+DATA = r'C:\Users\Chandra Sekhar\OneDrive\Documents\REAL TIME OBJECT DETECTION\backend\general object detection.v1i.yolov8\data.yaml'
+IMGSZ = 640
+PRUNE_RATIO = 0.4      # fraction of conv channels removed in total
+PRUNE_ROUNDS = 3       # prune a slice, fine-tune, repeat
+FINETUNE_EPOCHS = 10   # epochs of fine-tuning after each round
 
 model = YOLO('yolov8n.pt')
 model.train(
-    data=r'C:\Users\Chandra Sekhar\OneDrive\Documents\REAL TIME OBJECT DETECTION\backend\general object detection.v1i.yolov8\data.yaml',
+    data=DATA,
     epochs=25,
-    imgsz=640
-)
\ No newline at end of file
+    imgsz=IMGSZ
+)
+
+# Structured channel pruning of the trained model (the detection head is kept
+# intact). Fewer channels means proportionally fewer FLOPs at inference, and
+# the pruned model still quantizes to INT8 when app.py exports it.
+net = model.model
+for p in net.parameters():
+    p.requires_grad_(True)
+pruner = tp.pruner.MetaPruner(
+    net,
+    torch.randn(1, 3, IMGSZ, IMGSZ),
+    importance=tp.importance.GroupNormImportance(p=2),
+    pruning_ratio=PRUNE_RATIO,
+    iterative_steps=PRUNE_ROUNDS,
+    ignored_layers=[m for m in net.modules() if isinstance(m, Detect)],
+)
+for step in range(PRUNE_ROUNDS):
+    pruner.step()
+    # Hand the pruned module to the trainer directly: model.train() would
+    # rebuild the unpruned architecture from the yaml and reload weights.
+    trainer = DetectionTrainer(overrides={
+        'model': 'yolov8n.pt',
+        'data': DATA,
+        'epochs': FINETUNE_EPOCHS,
+        'imgsz': IMGSZ,
+        'name': f'prune_step{step + 1}',
+    })
+    trainer.model = net
+    trainer.train()
+    net = trainer.model
+
+# Copy this to backend/weights/best.pt (and delete any cached .engine /
+# _openvino_model next to it) so app.py exports and serves the pruned model.
+print(f'Pruned weights: {trainer.best}')
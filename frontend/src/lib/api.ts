@@ -19,7 +19,12 @@ export async function uploadFile(file: File): Promise<{message: string; resultUr
     throw new Error(error.message || 'Upload failed');
   }
 
-  const data = await response.json();
+  let data = await response.json();
+
+  // Videos are processed in the background; poll until the job finishes
+  if (data.status_url) {
+    data = await pollUploadJob(data.status_url);
+  }
   
   // Construct full URL for the processed file if output path is provided
   if (data.output) {
@@ -31,6 +36,25 @@ export async function uploadFile(file: File): Promise<{message: string; resultUr
   return data;
 }
 
+/**
+ * Poll a background upload job until it is no longer running
+ * @param statusUrl The job status path returned by /upload
+ * @returns The finished job's detection results
+ */
+async function pollUploadJob(statusUrl: string, intervalMs = 1000): Promise<any> {
+  for (;;) {
+    const response = await fetch(`${API_BASE}${statusUrl}`);
+    const data = await response.json().catch(() => ({}));
+    if (!response.ok) {
+      throw new Error(data.error || 'Detection failed');
+    }
+    if (data.status !== 'running') {
+      return data;
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+}
+
 /**
  * Start webcam stream detection
  * @param cameraId The camera device ID (default: 0 for default camera)